@@ -0,0 +1,85 @@
+# bench_batching.py
+"""
+Benchmarks LLM micro-batching through the real handler path: each simulated user sends one
+message, routed through PerUserUpdateProcessor into handle_message and the LLMBatcher.
+
+Usage:
+    python bench_batching.py [ollama|gemini] [n_users] [arrival_gap_ms]
+    python bench_batching.py simulate [n_users] [arrival_gap_ms]
+
+`simulate` replaces the backend with a stand-in for an Ollama server with
+OLLAMA_NUM_PARALLEL=4 slots and 0.5s per request, so the sweep can run without a model.
+"""
+import asyncio
+import math
+import sys
+import threading
+import time
+from types import SimpleNamespace
+import telegram_bot
+from llm_batcher import LLMBatcher
+
+SWEEP = [(0, 1), (0, 4), (10, 4), (20, 4), (50, 4), (20, 8), (100, 8)] # (window_ms, max_batch_size)
+
+_slots = threading.BoundedSemaphore(4)
+
+def simulated_respond(user_input: str, history: list, session=None) -> str:
+    with _slots: # Requests beyond the server's parallel slots queue up
+        time.sleep(0.5)
+    return "Simulated answer."
+
+
+def fake_update(update_id: int, user_id: int, text: str, replies: dict):
+    async def reply_text(reply, **kwargs):
+        replies[update_id] = time.perf_counter()
+    message = SimpleNamespace(text=text, reply_text=reply_text)
+    return SimpleNamespace(update_id=update_id, effective_user=SimpleNamespace(id=user_id), message=message)
+
+
+async def run(backend: str, n_users: int, gap: float, batcher, concurrent: bool):
+    telegram_bot.llm_batcher = batcher
+    telegram_bot.user_sessions.clear()
+    for user_id in range(n_users):
+        telegram_bot.user_models[user_id] = backend
+    processor = telegram_bot.PerUserUpdateProcessor(telegram_bot.MAX_CONCURRENT_UPDATES)
+    sent, replies, tasks = {}, {}, []
+
+    start = time.perf_counter()
+    for i in range(n_users):
+        sent[i] = start + i * gap # Latency counts from arrival, including time queued behind other updates
+        await asyncio.sleep(max(0, sent[i] - time.perf_counter()))
+        update = fake_update(i, i, f"In one sentence, what does Section {129 + i % 4} of the MV Act cover?", replies)
+        coroutine = telegram_bot.handle_message(update, None)
+        if concurrent:
+            tasks.append(asyncio.create_task(processor.process_update(update, coroutine)))
+        else:
+            await coroutine # Default python-telegram-bot behaviour: one update at a time
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(replies[i] - sent[i] for i in sent)
+    p50 = latencies[math.ceil(0.5 * len(latencies)) - 1]
+    p95 = latencies[math.ceil(0.95 * len(latencies)) - 1]
+    return n_users / elapsed, p50, p95
+
+
+def main():
+    backend = sys.argv[1] if len(sys.argv) > 1 else "ollama"
+    n_users = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    gap = (int(sys.argv[3]) if len(sys.argv) > 3 else 50) / 1000
+    if backend == "simulate":
+        telegram_bot.ollama_respond = simulated_respond
+        backend = "ollama"
+
+    print(f"{n_users} users, one message every {gap * 1000:.0f}ms")
+    throughput, p50, p95 = asyncio.run(run(backend, n_users, gap, None, concurrent=False))
+    print(f"batching off (sequential)  | {throughput:6.2f} msg/s | p50={p50:6.2f}s p95={p95:6.2f}s")
+    for window_ms, max_batch_size in SWEEP:
+        batcher = LLMBatcher(window_ms, max_batch_size)
+        throughput, p50, p95 = asyncio.run(run(backend, n_users, gap, batcher, concurrent=True))
+        batcher.executor.shutdown()
+        print(f"window={window_ms:>4}ms batch={max_batch_size:>2} | {throughput:6.2f} msg/s | p50={p50:6.2f}s p95={p95:6.2f}s")
+
+
+if __name__ == "__main__":
+    main()
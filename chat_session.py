@@ -2,6 +2,7 @@ class ChatSession:
     def __init__(self):
         self.history = []
         self.temp_lead_data = {} # NEW: Dictionary to store temporary lead data
+        self.ollama_context = None # Token context returned by Ollama's /api/generate
 
     def add_user_message(self, message):
         self.history.append({"role": "user", "content": message})
@@ -12,6 +13,7 @@ class ChatSession:
     def reset(self):
         self.history = []
         self.temp_lead_data = {} # NEW: Reset temp data too
+        self.clear_llm_context()
 
     def get_history(self):
         return self.history
@@ -19,6 +21,16 @@ class ChatSession:
     def format_for_prompt(self):
         return "\n".join([f"{msg['role'].capitalize()}: {msg['content']}" for msg in self.history])
 
+    # Ollama KV context reuse: only valid for the model/conversation that produced it
+    def set_llm_context(self, llm_context):
+        self.ollama_context = llm_context
+
+    def get_llm_context(self):
+        return self.ollama_context
+
+    def clear_llm_context(self):
+        self.ollama_context = None
+
     # NEW: Methods to manage temporary lead data
     def set_temp_lead_data(self, key, value):
         self.temp_lead_data[key] = value
@@ -21,6 +21,31 @@ ZOHO_CRM_SCOPES = "ZohoCRM.modules.leads.CREATE,ZohoCRM.modules.leads.READ,ZohoC
 # Ollama Configuration (if you use Ollama)
 OLLAMA_API_URL = os.getenv("OLLAMA_API_URL", "http://localhost:11434/api/generate")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "phi3:mini")
+# Token context returned by Ollama is reused between turns; once it grows past this
+# many tokens it is dropped and the next turn re-prefills from the short history window.
+# Keep it near the size of a system prompt + 4-message prompt: if another request took the
+# server's slot in between, the whole context is re-prefilled, so this bounds the miss cost.
+OLLAMA_MAX_CONTEXT_TOKENS = int(os.getenv("OLLAMA_MAX_CONTEXT_TOKENS", "512"))
+OLLAMA_REQUEST_TIMEOUT = int(os.getenv("OLLAMA_REQUEST_TIMEOUT", "120"))
+
+# Pre-generated greeting/confirmation templates kept per backend (0 disables the pool)
+MESSAGE_POOL_SIZE = int(os.getenv("MESSAGE_POOL_SIZE", "5"))
+# Seconds to wait before retrying a refill that produced no usable template (doubles up to 16x)
+MESSAGE_POOL_RETRY_BACKOFF = int(os.getenv("MESSAGE_POOL_RETRY_BACKOFF", "60"))
+
+# Optional micro-batching of concurrent LLM requests (see bench_batching.py and the README for measurements).
+# Keep LLM_BATCH_MAX_SIZE in line with the Ollama server's OLLAMA_NUM_PARALLEL.
+LLM_BATCHING_ENABLED = os.getenv("LLM_BATCHING_ENABLED", "false").lower() == "true"
+LLM_BATCH_WINDOW_MS = int(os.getenv("LLM_BATCH_WINDOW_MS", "10"))
+LLM_BATCH_MAX_SIZE = int(os.getenv("LLM_BATCH_MAX_SIZE", "4"))
+# Batching needs updates from different users processed concurrently; this caps how many at once
+MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES", "64"))
+
+# On-demand profiling (/profile command or SIGUSR1), restricted to these Telegram user IDs
+ADMIN_USER_IDS = {int(uid) for uid in os.getenv("ADMIN_USER_IDS", "").split(",") if uid.strip()}
+PROFILE_OUTPUT_DIR = os.getenv("PROFILE_OUTPUT_DIR", "profiles")
+PROFILE_DEFAULT_UPDATES = int(os.getenv("PROFILE_DEFAULT_UPDATES", "20"))
+LOOP_LAG_THRESHOLD_MS = int(os.getenv("LOOP_LAG_THRESHOLD_MS", "200"))
 
 # --- Persistent Token Storage for the entire application ---
 TOKEN_FILE = "zoho_tokens.json"
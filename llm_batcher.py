@@ -0,0 +1,76 @@
+# llm_batcher.py
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from config import LLM_BATCH_WINDOW_MS, LLM_BATCH_MAX_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+class LLMBatcher:
+    """
+    Collects concurrent LLM requests for a short window (or until max_batch_size is reached)
+    and dispatches them together, so Ollama can serve them in parallel slots and Gemini
+    requests are submitted concurrently. Results are fanned back to the waiting handlers.
+    """
+    def __init__(self, window_ms: int = LLM_BATCH_WINDOW_MS, max_batch_size: int = LLM_BATCH_MAX_SIZE):
+        self.window = window_ms / 1000
+        self.max_batch_size = max(1, max_batch_size)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_batch_size, thread_name_prefix="llm-batch")
+        self.pending = []
+        self._timer = None
+        self._tasks = set() # Running dispatches, referenced so they aren't garbage-collected
+
+    async def submit(self, respond, *args, **kwargs):
+        """Queues respond(*args, **kwargs) for the next batch and waits for its result."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((respond, args, kwargs, future))
+
+        if len(self.pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self.pending = self.pending[:self.max_batch_size], self.pending[self.max_batch_size:]
+        if self.pending: # Overflow goes out in the next window
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        if batch:
+            logger.debug(f"Dispatching LLM batch of {len(batch)} request(s)")
+            task = asyncio.ensure_future(self._dispatch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(functools.partial(self._dispatch_done, batch))
+
+    async def _dispatch(self, batch):
+        loop = asyncio.get_running_loop()
+        calls = [loop.run_in_executor(self.executor, lambda r=respond, a=args, k=kwargs: r(*a, **k))
+                 for respond, args, kwargs, _ in batch]
+        results = await asyncio.gather(*calls, return_exceptions=True)
+        for (_, _, _, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def _dispatch_done(self, batch, task):
+        self._tasks.discard(task)
+        if task.cancelled():
+            error = asyncio.CancelledError()
+        elif task.exception() is not None:
+            error = task.exception()
+            logger.error(f"Error dispatching LLM batch: {error}")
+        else:
+            return
+        # Don't leave handlers waiting on results the dispatch never set
+        for _, _, _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
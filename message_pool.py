@@ -0,0 +1,142 @@
+# message_pool.py
+import threading
+import logging
+import time
+from collections import deque
+from string import Formatter
+from config import MESSAGE_POOL_SIZE, MESSAGE_POOL_RETRY_BACKOFF
+
+logger = logging.getLogger(__name__)
+
+GREETING = "greeting"
+CONFIRMATION = "confirmation"
+
+# Prompts ask the LLM for a reusable template; the placeholders are filled in at send time.
+TEMPLATE_PROMPTS = {
+    GREETING: (
+        "Write a short, warm greeting for a returning client of Indian Law Bot and offer assistance "
+        "with their legal queries. Keep it concise and professional. Mention that you're an Indian Law Bot. "
+        "Write the literal placeholder {name} exactly once where the client's name goes. "
+        "Do not use any other curly braces. Reply with the greeting only."
+    ),
+    CONFIRMATION: (
+        "Write a short message thanking a new client for sharing their details, which have been saved in our CRM. "
+        "Assure them that someone from Indian Law Bot will reach out soon and offer to answer a legal question now. "
+        "Write the literal placeholders {name}, {email} and {phone} where the client's name, email and phone go. "
+        "Do not use any other curly braces. Reply with the message only."
+    ),
+}
+
+REQUIRED_FIELDS = {
+    GREETING: {"name"},
+    CONFIRMATION: {"name"},
+}
+ALLOWED_FIELDS = {"name", "email", "phone"}
+
+
+def _template_fields(template: str):
+    """
+    Returns the placeholder names used in a template, or None if it isn't a plain format string.
+    Format specs and conversions ({name:d}, {name!x}) are rejected since they can fail at send time.
+    """
+    try:
+        parsed = [(field, spec, conversion) for _, field, spec, conversion in Formatter().parse(template) if field is not None]
+    except ValueError:
+        return None
+    if any(spec or conversion for _, spec, conversion in parsed):
+        return None
+    return {field for field, _, _ in parsed}
+
+
+class MessagePool:
+    """
+    Keeps pre-generated greeting/confirmation templates per backend so onboarding replies
+    don't wait on an LLM call. Templates are refilled on a background thread, one LLM call
+    per template taken, and only for backends that are actually used.
+    """
+    def __init__(self, backends: dict, size: int = MESSAGE_POOL_SIZE, retry_backoff: int = MESSAGE_POOL_RETRY_BACKOFF):
+        self.backends = backends # backend name -> get_response(user_input, history)
+        self.size = size
+        self.retry_backoff = retry_backoff
+        self.templates = {(kind, backend): deque() for kind in TEMPLATE_PROMPTS for backend in backends}
+        self._refilling = set()
+        self._failures = {} # (kind, backend) -> consecutive refills that produced nothing
+        self._retry_at = {} # (kind, backend) -> monotonic time before which no refill is started
+        self._lock = threading.Lock()
+
+    def warm(self, backend: str):
+        """Starts background refills for every message kind of one backend."""
+        for kind in TEMPLATE_PROMPTS:
+            self.refill(kind, backend)
+
+    def take(self, kind: str, backend: str, **fields):
+        """Pops a template and fills it in, or returns None if the pool is empty."""
+        if self.size <= 0:
+            return None
+        with self._lock:
+            pool = self.templates.get((kind, backend))
+            template = pool.popleft() if pool else None
+        self.refill(kind, backend)
+        if template is None:
+            logger.info(f"No pre-generated {kind} available for {backend}, falling back to inline generation.")
+            return None
+        try:
+            return template.format(**{field: fields.get(field, "") for field in ALLOWED_FIELDS})
+        except (ValueError, KeyError, IndexError) as e:
+            logger.error(f"Discarded malformed {kind} template from {backend}: {e}")
+            return None
+
+    def refill(self, kind: str, backend: str):
+        """Tops the pool up on a daemon thread unless a refill for it is already running."""
+        if self.size <= 0 or (kind, backend) not in self.templates:
+            return
+        key = (kind, backend)
+        with self._lock:
+            missing = self.size - len(self.templates[key])
+            if key in self._refilling or missing <= 0 or time.monotonic() < self._retry_at.get(key, 0):
+                return
+            self._refilling.add(key)
+        threading.Thread(target=self._refill, args=(kind, backend, missing), daemon=True).start()
+
+    def _refill(self, kind: str, backend: str, missing: int):
+        key = (kind, backend)
+        respond = self.backends[backend]
+        added = 0
+        try:
+            # One attempt per missing template, stopping at the first unusable one; the rest
+            # are retried by a later refill (after a backoff if nothing was added).
+            for _ in range(missing):
+                template = respond(TEMPLATE_PROMPTS[kind], history=[])
+                if not self._is_valid(kind, template):
+                    logger.debug(f"Discarded {kind} template from {backend}: {template!r}")
+                    break
+                with self._lock:
+                    self.templates[key].append(template)
+                added += 1
+        except Exception as e:
+            logger.error(f"Error pre-generating {kind} templates with {backend}: {e}")
+        finally:
+            with self._lock:
+                self._refilling.discard(key)
+                if added:
+                    self._failures.pop(key, None)
+                    self._retry_at.pop(key, None)
+                else:
+                    failures = self._failures.get(key, 0) + 1
+                    self._failures[key] = failures
+                    delay = self.retry_backoff * 2 ** min(failures - 1, 4)
+                    self._retry_at[key] = time.monotonic() + delay
+                    logger.warning(f"No usable {kind} templates from {backend}, next refill in {delay}s.")
+
+    @staticmethod
+    def _is_valid(kind: str, template: str) -> bool:
+        if not template or template.startswith("⚠️"): # Backends return errors as text
+            return False
+        fields = _template_fields(template)
+        if fields is None or not REQUIRED_FIELDS[kind] <= fields <= ALLOWED_FIELDS:
+            return False
+        try:
+            template.format(**{field: "x" for field in ALLOWED_FIELDS})
+        except (ValueError, KeyError, IndexError):
+            return False
+        return True
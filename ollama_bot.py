@@ -1,10 +1,15 @@
 # ollama_bot.py
-from langchain_ollama.llms import OllamaLLM
 import re
-from config import OLLAMA_API_URL, OLLAMA_MODEL # Import from config
+import requests
+from config import OLLAMA_API_URL, OLLAMA_MODEL, OLLAMA_MAX_CONTEXT_TOKENS, OLLAMA_REQUEST_TIMEOUT # Import from config
 
-# Load local Ollama model
-llm = OllamaLLM(model=OLLAMA_MODEL, base_url=OLLAMA_API_URL) # Use config for model and URL
+# Add system instruction for better legal, focused replies
+SYSTEM_INSTRUCTION = (
+    "You are an Indian law assistant. Answer user queries factually. "
+    "Refer to Indian laws like MV Act, RTI Act, IT Act, etc. "
+    "Do not invent or refer to previous questions unless asked directly. "
+    "Be concise and avoid generic inspirational or global content.\n\n"
+)
 
 def cleanup_fake_sections(response: str) -> str:
     """
@@ -23,28 +28,47 @@ def cleanup_fake_sections(response: str) -> str:
 
     return re.sub(pattern, replace_if_fake, response)
 
-def get_response(user_input: str, history: list) -> str:
-    # Format history with clear turn separators
-    formatted_history = ""
-    for msg in history:
-        role = msg['role'].capitalize()
-        content = msg['content']
-        formatted_history += f"{role}: {content}\n---\n"
-
-    # Add system instruction for better legal, focused replies
-    system_instruction = (
-        "You are an Indian law assistant. Answer user queries factually. "
-        "Refer to Indian laws like MV Act, RTI Act, IT Act, etc. "
-        "Do not invent or refer to previous questions unless asked directly. "
-        "Be concise and avoid generic inspirational or global content.\n\n"
-    )
-
-    # Combine instruction, history, and current user input for the prompt
-    full_prompt = f"{system_instruction}{formatted_history}User: {user_input}\nBot:"
+def _generate(prompt: str, llm_context=None):
+    """Calls Ollama's /api/generate and returns (response_text, new_context)."""
+    payload = {
+        "model": OLLAMA_MODEL,
+        "prompt": prompt,
+        "stream": False,
+    }
+    if llm_context:
+        payload["context"] = llm_context
+    response = requests.post(OLLAMA_API_URL, json=payload, timeout=OLLAMA_REQUEST_TIMEOUT)
+    response.raise_for_status()
+    data = response.json()
+    return data.get("response", ""), data.get("context")
+
+def get_response(user_input: str, history: list, session=None) -> str:
+    # Reuse the token context from the previous turn so Ollama keeps its KV cache
+    # and only prefills the new user message. The context is capped near the size of
+    # the short history prompt, which bounds both memory and the cost of a cache miss.
+    llm_context = session.get_llm_context() if session else None
+    if llm_context and len(llm_context) > OLLAMA_MAX_CONTEXT_TOKENS:
+        llm_context = None # Too long, rebuild from the short history window below
+
+    if llm_context:
+        full_prompt = f"User: {user_input}\nBot:"
+    else:
+        # Format history with clear turn separators
+        formatted_history = ""
+        for msg in history:
+            role = msg['role'].capitalize()
+            content = msg['content']
+            formatted_history += f"{role}: {content}\n---\n"
+
+        # Combine instruction, history, and current user input for the prompt
+        full_prompt = f"{SYSTEM_INSTRUCTION}{formatted_history}User: {user_input}\nBot:"
 
     try:
-        # Pass the full prompt to the LLM
-        response_text = llm.invoke(full_prompt) # Use invoke for OllamaLLM
+        response_text, new_context = _generate(full_prompt, llm_context)
+        if session:
+            session.set_llm_context(new_context)
         return cleanup_fake_sections(response_text).strip()
     except Exception as e:
+        if session:
+            session.clear_llm_context()
         return f"⚠️ Ollama Error: {e}"
\ No newline at end of file
@@ -0,0 +1,134 @@
+# profiling.py
+import cProfile
+import functools
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+import asyncio
+from config import PROFILE_OUTPUT_DIR, LOOP_LAG_THRESHOLD_MS
+
+logger = logging.getLogger(__name__)
+
+
+class EventLoopLagMonitor:
+    """
+    Schedules a heartbeat on the event loop and watches it from a daemon thread.
+    Whenever the loop goes longer than the threshold without a beat, the loop thread's
+    stack is logged so the blocking call can be identified.
+    """
+    def __init__(self, threshold_ms: int = LOOP_LAG_THRESHOLD_MS):
+        self.threshold = threshold_ms / 1000
+        self.running = False
+        self.last_beat = 0.0
+        self.loop = None
+        self.loop_thread_id = None
+        self.generation = 0 # Lets a watcher or heartbeat from a previous start/stop cycle exit
+        self.beat_handle = None
+
+    def start(self, loop):
+        if self.running:
+            return
+        self.running = True
+        self.loop = loop
+        self.loop_thread_id = threading.get_ident()
+        self.last_beat = time.monotonic()
+        self.generation += 1
+        self.beat_handle = loop.call_soon(self._beat, self.generation)
+        threading.Thread(target=self._watch, args=(self.generation,), name="loop-lag-monitor", daemon=True).start()
+        logger.info(f"Event-loop lag monitor started (threshold {self.threshold * 1000:.0f}ms)")
+
+    def stop(self):
+        if self.running:
+            self.running = False
+            if self.beat_handle is not None:
+                self.beat_handle.cancel()
+                self.beat_handle = None
+            logger.info("Event-loop lag monitor stopped")
+
+    def _beat(self, generation: int):
+        if not self.running or self.generation != generation:
+            return
+        self.last_beat = time.monotonic()
+        self.beat_handle = self.loop.call_later(self.threshold / 4, self._beat, generation)
+
+    def _watch(self, generation: int):
+        reported_beat = None
+        while self.running and self.generation == generation:
+            time.sleep(self.threshold / 2)
+            last_beat = self.last_beat
+            lag = time.monotonic() - last_beat
+            if lag > self.threshold and reported_beat != last_beat:
+                reported_beat = last_beat # One snapshot per stall
+                frame = sys._current_frames().get(self.loop_thread_id)
+                stack = "".join(traceback.format_stack(frame)) if frame else "<no frame>"
+                logger.warning(f"Event loop blocked for {lag * 1000:.0f}ms, loop thread stack:\n{stack}")
+
+
+class HandlerProfiler:
+    """
+    Profiles the next N updates handled by wrapped handlers and writes one timestamped
+    .prof file per update. When no updates are requested the wrapper only checks a counter.
+    """
+    def __init__(self, output_dir: str = PROFILE_OUTPUT_DIR, lag_threshold_ms: int = LOOP_LAG_THRESHOLD_MS):
+        self.output_dir = output_dir
+        self.remaining = 0
+        self.active = False # cProfile can't nest, so only one update is profiled at a time
+        self.lag_monitor = EventLoopLagMonitor(lag_threshold_ms)
+
+    def enable(self, n_updates: int):
+        """Profiles the next n_updates updates. Safe to call from a signal handler."""
+        self.remaining = max(0, n_updates)
+        logger.info(f"Profiling enabled for the next {self.remaining} update(s), writing to {self.output_dir}/")
+
+    def disable(self):
+        self.remaining = 0
+        self.lag_monitor.stop()
+
+    def wrap(self, handler):
+        @functools.wraps(handler)
+        async def wrapper(update, context):
+            if not self.remaining or self.active:
+                return await handler(update, context)
+            return await self._profile(handler, update, context)
+        return wrapper
+
+    async def _profile(self, handler, update, context):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e: # Another profiler is already active in this interpreter
+            logger.error(f"Cannot profile handlers while another profiler is active, disabling profiling: {e}")
+            self.disable()
+            return await handler(update, context)
+
+        self.lag_monitor.start(asyncio.get_running_loop())
+        self.active = True
+        self.remaining -= 1
+        started = time.perf_counter()
+        try:
+            return await handler(update, context)
+        finally:
+            profiler.disable()
+            self.active = False
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self._dump(profiler, handler.__name__, update, elapsed_ms)
+            if not self.remaining:
+                self.disable()
+                logger.info("Profiling finished.")
+
+    def _dump(self, profiler, handler_name: str, update, elapsed_ms: float):
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            timestamp = time.strftime("%Y%m%d-%H%M%S")
+            path = os.path.join(self.output_dir, f"{timestamp}_{handler_name}_{update.update_id}.prof")
+            profiler.dump_stats(path)
+            logger.info(f"Profiled {handler_name} ({elapsed_ms:.0f}ms) -> {path}")
+        except OSError as e:
+            logger.error(f"Error writing profile for {handler_name}: {e}")
+
+
+profiler = HandlerProfiler()
+profiled = profiler.wrap
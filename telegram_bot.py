@@ -1,17 +1,21 @@
 # telegram_bot.py
 import os
 import asyncio
+import signal
 from telegram import Update, ForceReply, ReplyKeyboardRemove, KeyboardButton, ReplyKeyboardMarkup
 from telegram.ext import (
     ApplicationBuilder, CommandHandler, MessageHandler, ContextTypes, filters,
-    ConversationHandler
+    ConversationHandler, BaseUpdateProcessor
 )
 from chat_session import ChatSession
 from gemini_bot import get_response as gemini_respond
 from ollama_bot import get_response as ollama_respond
 from zoho_leads import search_lead_by_phone, create_lead
 from zoho_auth import get_access_token
-from config import TELEGRAM_BOT_TOKEN
+from message_pool import MessagePool, GREETING, CONFIRMATION
+from llm_batcher import LLMBatcher
+from profiling import profiler, profiled
+from config import TELEGRAM_BOT_TOKEN, LLM_BATCHING_ENABLED, MAX_CONCURRENT_UPDATES, ADMIN_USER_IDS, PROFILE_DEFAULT_UPDATES
 import logging
 
 # Enable logging
@@ -24,10 +28,56 @@ logger = logging.getLogger(__name__)
 user_sessions = {}       # user_id -> ChatSession
 user_models = {}         # user_id -> 'gemini' or 'ollama'
 
+# Pre-generated onboarding messages, refilled in the background
+message_pool = MessagePool({"gemini": gemini_respond, "ollama": ollama_respond})
+
+# Optional micro-batcher in front of the LLM backends
+llm_batcher = LLMBatcher() if LLM_BATCHING_ENABLED else None
+
+async def generate(respond, *args, **kwargs) -> str:
+    """Runs an LLM call through the micro-batcher when enabled, otherwise calls it directly."""
+    if llm_batcher:
+        return await llm_batcher.submit(respond, *args, **kwargs)
+    return respond(*args, **kwargs)
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """
+    Processes updates from different users concurrently so their LLM calls can be batched,
+    but one at a time per user. ChatSession, user_models and the ConversationHandler state
+    are all per user, so a /reset or /model waits for that user's running LLM call to finish.
+    """
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self.user_locks = {} # user_id -> [asyncio.Lock, number of updates holding or waiting for it]
+
+    async def do_process_update(self, update, coroutine):
+        user = getattr(update, "effective_user", None)
+        if user is None:
+            await coroutine
+            return
+        entry = self.user_locks.get(user.id)
+        if entry is None:
+            entry = self.user_locks[user.id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                await coroutine
+        finally:
+            entry[1] -= 1
+            if not entry[1]: # Last update for this user, so the lock isn't kept for idle users
+                del self.user_locks[user.id]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
 # Conversation states for lead capture
 GET_NAME, GET_EMAIL, CONFIRM_PHONE = range(3)
 
 # === Start Command ===
+@profiled
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     user_id = update.effective_user.id
     chat_id = update.effective_chat.id
@@ -66,12 +116,14 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
             first_name = lead.get('First_Name', 'there')
             last_name = lead.get('Last_Name', '')
             full_name = f"{first_name} {last_name}".strip()
-            # Personalized greeting using LLM
-            prompt = f"The user's name is {full_name}. Greet them warmly and offer assistance based on typical SaaS product inquiries. Keep it concise and professional. Mention that you're an Indian Law Bot."
+            # Personalized greeting from the pre-generated pool, falling back to an inline LLM call
+            llm_greeting = message_pool.take(GREETING, user_models[user_id], name=full_name)
+            if llm_greeting is None:
+                prompt = f"The user's name is {full_name}. Greet them warmly and offer assistance based on typical SaaS product inquiries. Keep it concise and professional. Mention that you're an Indian Law Bot."
 
-            # Use the selected LLM
-            respond = gemini_respond if user_models[user_id] == "gemini" else ollama_respond
-            llm_greeting = respond(prompt, history=session.get_history()) # Pass current session history for context
+                # Use the selected LLM
+                respond = gemini_respond if user_models[user_id] == "gemini" else ollama_respond
+                llm_greeting = await generate(respond, prompt, history=session.get_history()) # Pass current session history for context
 
             await update.message.reply_text(f"👋 {llm_greeting}", reply_markup=ReplyKeyboardRemove())
             return ConversationHandler.END # End conversation for existing lead
@@ -90,6 +142,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         return GET_NAME
 
 # === Lead Capture Handlers ===
+@profiled
 async def get_name(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     user_id = update.effective_user.id
     session = user_sessions.setdefault(user_id, ChatSession()) # Ensure session exists
@@ -112,6 +165,7 @@ async def get_name(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     session.set_temp_lead_data('current_state', GET_EMAIL)
     return GET_EMAIL
 
+@profiled
 async def get_email(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     user_id = update.effective_user.id
     session = user_sessions.setdefault(user_id, ChatSession())
@@ -139,6 +193,7 @@ async def get_email(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     else:
         return await finalize_lead_creation(update, context)
 
+@profiled
 async def confirm_phone(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     user_id = update.effective_user.id
     session = user_sessions.setdefault(user_id, ChatSession())
@@ -181,8 +236,10 @@ async def finalize_lead_creation(update: Update, context: ContextTypes.DEFAULT_T
     respond = gemini_respond if user_models[user_id] == "gemini" else ollama_respond
 
     if new_lead:
-        prompt = f"A new lead named {first_name} with email {email} and phone {phone_number} has been created in CRM. Thank them for their details and assure them that someone from Indian Law Bot will reach out soon. Offer to answer a legal question now. Be concise."
-        llm_confirmation = respond(prompt, history=session.get_history())
+        llm_confirmation = message_pool.take(CONFIRMATION, user_models[user_id], name=first_name, email=email, phone=phone_number)
+        if llm_confirmation is None:
+            prompt = f"A new lead named {first_name} with email {email} and phone {phone_number} has been created in CRM. Thank them for their details and assure them that someone from Indian Law Bot will reach out soon. Offer to answer a legal question now. Be concise."
+            llm_confirmation = await generate(respond, prompt, history=session.get_history())
         await update.message.reply_text(f"✅ {llm_confirmation}", reply_markup=ReplyKeyboardRemove())
     else:
         await update.message.reply_text(
@@ -203,6 +260,8 @@ async def model(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     choice = context.args[0].lower()
     if choice in ["gemini", "ollama"]:
+        if user_models.get(user_id) != choice:
+            session.clear_llm_context() # Ollama token context is only valid for the model that produced it
         user_models[user_id] = choice
         await update.message.reply_text(f"✅ Model set to: {choice.capitalize()}")
         # Also reset conversation state if mid-lead capture
@@ -213,6 +272,25 @@ async def model(update: Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         await update.message.reply_text("❌ Invalid model. Use /model gemini or /model ollama")
 
+# === Profiling Command (admin only) ===
+async def profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.effective_user.id
+    if user_id not in ADMIN_USER_IDS:
+        logger.warning(f"User {user_id} tried to use /profile without admin rights.")
+        return
+
+    if context.args and context.args[0].lower() == "off":
+        profiler.disable()
+        await update.message.reply_text("🛑 Profiling disabled.")
+        return
+    if context.args and not context.args[0].isdigit():
+        await update.message.reply_text("Usage: /profile [number of updates] or /profile off")
+        return
+
+    n_updates = int(context.args[0]) if context.args else PROFILE_DEFAULT_UPDATES
+    profiler.enable(n_updates)
+    await update.message.reply_text(f"⏱️ Profiling the next {n_updates} update(s).")
+
 # === Reset Command ===
 async def reset(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     user_id = update.effective_user.id
@@ -222,6 +300,7 @@ async def reset(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     return ConversationHandler.END # End any ongoing conversation
 
 # === Handle User Messages (Modified for general chat after lead capture or for existing leads) ===
+@profiled
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     query = update.message.text
@@ -240,8 +319,10 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     short_history = session.get_history()[-4:]
 
     # Generate response
-    respond = gemini_respond if model_choice == "gemini" else ollama_respond
-    response = respond(query, short_history)
+    if model_choice == "gemini":
+        response = await generate(gemini_respond, query, short_history)
+    else:
+        response = await generate(ollama_respond, query, short_history, session=session) # Reuses Ollama's token context
 
     # Add bot reply to memory
     session.add_bot_message(response)
@@ -271,7 +352,11 @@ async def fallback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
 
 # === Run Bot ===
 def main() -> None:
-    application = ApplicationBuilder().token(TELEGRAM_BOT_TOKEN).build()
+    builder = ApplicationBuilder().token(TELEGRAM_BOT_TOKEN)
+    if LLM_BATCHING_ENABLED:
+        # Updates are handled one at a time by default, which would leave every batch with a single request
+        builder = builder.concurrent_updates(PerUserUpdateProcessor(MAX_CONCURRENT_UPDATES))
+    application = builder.build()
 
     # Conversation handler for lead capture flow
     conv_handler = ConversationHandler(
@@ -295,6 +380,7 @@ def main() -> None:
     application.add_handler(conv_handler)
     # Add other handlers outside of the conversation if they should always work
     application.add_handler(CommandHandler("model", model))
+    application.add_handler(CommandHandler("profile", profile))
     # `handle_message` should ideally be the final catch-all *after* conversation handlers.
     # If a message doesn't match any conversation state, it will fall through to here.
     # However, since `fallback` above already routes unhandled texts to `handle_message`
@@ -308,6 +394,12 @@ def main() -> None:
     if not get_access_token():
         logger.warning("Zoho access token is not yet generated or loaded. Run zoho_auth.py manually once.")
 
+    # `kill -USR1 <pid>` turns on profiling without going through Telegram
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: profiler.enable(PROFILE_DEFAULT_UPDATES))
+
+    message_pool.warm("gemini") # Pre-generate templates for the default model; others fill on first use
+
 
     application.run_polling(allowed_updates=Update.ALL_TYPES)
 